@@ -2,19 +2,19 @@ import sys
 import sqlite3
 import asyncio
 import aiohttp
+import orjson
 import logging
 from PyQt5.QtWidgets import (
     QApplication,
     QMainWindow,
     QPushButton,
-    QTableWidget,
-    QTableWidgetItem,
+    QTableView,
     QVBoxLayout,
     QWidget,
     QProgressBar,
     QStatusBar,
 )
-from PyQt5.QtCore import QThread, pyqtSignal, QTimer
+from PyQt5.QtCore import QAbstractTableModel, QModelIndex, QThread, Qt, pyqtSignal, QTimer
 
 
 class StatusBarLogger(logging.Handler):
@@ -30,76 +30,221 @@ class StatusBarLogger(logging.Handler):
         self.status_bar.showMessage(msg, 3000)
 
 
+class PostsTableModel(QAbstractTableModel):
+    """Модель таблицы постов: строки хранятся списком готовых к показу кортежей (id, title, body)"""
+
+    HEADERS = ("ID", "Title", "Body")
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._rows: list[tuple[str, str, str]] = []
+
+    def set_rows(self, rows):
+        """Полная замена данных одним сбросом модели"""
+        self.beginResetModel()
+        self._rows = rows
+        self.endResetModel()
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self._rows)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.HEADERS)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if role != Qt.DisplayRole or not index.isValid():
+            return None
+        return self._rows[index.row()][index.column()]
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if role == Qt.DisplayRole and orientation == Qt.Horizontal:
+            return self.HEADERS[section]
+        return super().headerData(section, orientation, role)
+
+
+SQLITE_PRAGMAS = """
+    PRAGMA journal_mode=WAL;
+    PRAGMA synchronous=NORMAL;
+    PRAGMA temp_store=MEMORY;
+    PRAGMA busy_timeout=5000;
+"""
+
+CREATE_POSTS_SQL = """
+    CREATE TABLE IF NOT EXISTS posts (
+        id INTEGER PRIMARY KEY,
+        title TEXT,
+        body TEXT
+    )
+"""
+
+UPSERT_POSTS_SQL = """
+    INSERT INTO posts (id, title, body) VALUES (?, ?, ?)
+    ON CONFLICT(id) DO UPDATE SET title = excluded.title, body = excluded.body
+    WHERE title IS NOT excluded.title OR body IS NOT excluded.body
+"""
+
+POSTS_URL = "https://jsonplaceholder.typicode.com/posts"
+# У jsonplaceholder нет push-канала (WebSocket/SSE), поэтому изменения
+# получаем периодическим опросом с условными запросами (ETag)
+POLL_INTERVAL_MS = 10000
+
+
+def _configure(conn):
+    """Настройка соединения SQLite: WAL-журнал и облегчённая синхронизация.
+
+    Таблица постов — кэш данных с сервера, который перезаписывается каждые
+    10 секунд, поэтому synchronous=NORMAL здесь достаточно.
+    """
+    conn.executescript(SQLITE_PRAGMAS)
+    return conn
+
+
 class Worker(QThread):
-    update_data = pyqtSignal(list)  # Сигнал для передачи данных в интерфейс
     update_progress = pyqtSignal(int)  # Сигнал для обновления прогресс-бара
     update_status = pyqtSignal(str)  # Сигнал для обновления состояния статус-бара
 
     def __init__(self):
         super().__init__()
+        self.loop = asyncio.new_event_loop()  # Постоянный цикл событий фонового потока
+        self._session: aiohttp.ClientSession | None = None
+        # Валидаторы последнего ответа для условных запросов
+        self._etag: str | None = None
+        self._last_modified: str | None = None
+        # Текущий набор постов сервера: id -> (title, body)
+        self._saved: dict[int, tuple[str, str]] = {}
+
+        # Одно соединение с БД на всё время работы; запись идёт из пула потоков
+        self._conn = _configure(sqlite3.connect("posts.db", check_same_thread=False))
+        self._conn.execute(CREATE_POSTS_SQL)
+
+    async def _get_session(self):
+        """Общая HTTP-сессия с пулом соединений, создаётся при первом запросе"""
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(limit=10, keepalive_timeout=30)
+            self._session = aiohttp.ClientSession(connector=connector)
+        return self._session
+
+    async def aclose(self):
+        """Отмена фоновых задач и закрытие HTTP-сессии"""
+        tasks = [task for task in asyncio.all_tasks() if task is not asyncio.current_task()]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
 
     async def fetch_data(self):
-        """Асинхронная загрузка данных с сервера с обновлением прогресса"""
+        """Асинхронная загрузка данных с сервера с обновлением прогресса.
+
+        Возвращает None, если сервер ответил 304 и данные не изменились.
+        """
         self.update_status.emit("Загрузка данных с сервера...")  # Обновление статуса
         logging.info("Начало загрузки данных с сервера...")
 
-        # Симуляция загрузки с прогрессом
-        for i in range(0, 101, 10):  # Обновляем прогресс каждое 10%
-            self.update_progress.emit(i)  # Обновление прогресса
-            await asyncio.sleep(0.5)  # Искусственная задержка для симуляции загрузки
-
-        url = "https://jsonplaceholder.typicode.com/posts"
-        async with aiohttp.ClientSession() as session:
-            async with session.get(url) as response:
-                data = await response.json()
+        # Загрузка занимает первую половину прогресс-бара, сохранение — вторую
+        self.update_progress.emit(10)  # Подключение к серверу
+        url = POSTS_URL
+        headers = {}
+        if self._etag:
+            headers["If-None-Match"] = self._etag
+        if self._last_modified:
+            headers["If-Modified-Since"] = self._last_modified
+        session = await self._get_session()
+        async with session.get(url, headers=headers) as response:
+            if response.status == 304:
+                logging.info("Данные на сервере не изменились.")
+                self.update_status.emit("Данные не изменились.")  # Обновление статуса
+                return None
+            response.raise_for_status()  # Ошибочный ответ не должен оставлять валидаторы
+            etag = response.headers.get("ETag")
+            last_modified = response.headers.get("Last-Modified")
+            total = response.content_length
+            received = 0
+            chunks = []
+            async for chunk in response.content.iter_chunked(8192):
+                chunks.append(chunk)
+                if total:
+                    # Content-Length относится к сжатому телу, поэтому ограничиваем сверху
+                    received = min(received + len(chunk), total)
+                    self.update_progress.emit(10 + 40 * received // total)
+        data = orjson.loads(b"".join(chunks))
+        # Валидаторы запоминаются только после полного чтения и разбора тела
+        self._etag, self._last_modified = etag, last_modified
+        self.update_progress.emit(50)  # Ответ получен и разобран
 
         logging.info("Загрузка данных завершена.")
         self.update_status.emit("Загрузка данных завершена.")  # Обновление статуса
         return data
 
-    async def save_to_database(self, data):
+    def _save_sync(self, payload):
+        """Синхронная запись данных в SQLite (выполняется в пуле потоков).
+
+        payload содержит все посты сервера и заменяет набор известных постов.
+        """
+        saved = self._saved
+        rows = list(zip(*payload))
+        changed = [row for row in rows if saved.get(row[0]) != row[1:]]
+        if changed:
+            # Все строки пишутся одной транзакцией: один fsync вместо одного на строку.
+            # UPSERT не трогает строки, содержимое которых не поменялось
+            with self._conn:
+                self._conn.executemany(UPSERT_POSTS_SQL, changed)
+        self._saved = {row[0]: row[1:] for row in rows}
+
+    async def save_to_database(self, payload):
         """Асинхронное сохранение данных в SQLite"""
         self.update_status.emit("Сохранение данных в базу данных...")  # Обновление статуса
         logging.info("Начало сохранения данных в базу данных...")
 
-        # Симуляция сохранения с прогрессом
-        for i in range(0, 101, 10):  # Обновляем прогресс каждое 10%
-            self.update_progress.emit(i)  # Обновление прогресса
-            await asyncio.sleep(0.5)  # Искусственная задержка для симуляции сохранения
-
-        conn = sqlite3.connect("posts.db")
-        cursor = conn.cursor()
-        cursor.execute(
-            """
-            CREATE TABLE IF NOT EXISTS posts (
-                id INTEGER PRIMARY KEY,
-                title TEXT,
-                body TEXT
-            )
-        """
-        )
-        for post in data:
-            cursor.execute(
-                "INSERT OR REPLACE INTO posts (id, title, body) VALUES (?, ?, ?)",
-                (post["id"], post["title"], post["body"]),
-            )
-        conn.commit()
-        conn.close()
+        # sqlite3 блокирующий, поэтому запись выполняется вне цикла событий
+        await asyncio.to_thread(self._save_sync, payload)
+        self.update_progress.emit(100)  # Транзакция зафиксирована
         logging.info("Данные успешно сохранены в базу данных.")
         self.update_status.emit("Данные успешно сохранены.")  # Обновление статуса
 
-    def run(self):
-        """Запуск асинхронной загрузки данных и их сохранение в фоновом потоке"""
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
+    async def fetch_and_save(self):
+        """Загрузка данных с сервера и их сохранение; данные возвращаются для интерфейса.
+
+        Данные возвращаются кортежем параллельных столбцов (ids, titles, bodies)
+        или None, если данные на сервере не изменились.
+        """
         self.update_progress.emit(0)  # Начало загрузки
-        data = loop.run_until_complete(self.fetch_data())
-        loop.run_until_complete(self.save_to_database(data))
-        self.update_progress.emit(100)  # Завершение загрузки
-        self.update_data.emit(data)  # Передача данных в UI
+        data = await self.fetch_data()
+        if data is None:
+            self.update_progress.emit(100)  # Сохранять нечего
+            return None
+        # Столбцы вместо списка словарей: меньше объектов передаётся между потоками
+        payload = tuple(zip(*((post["id"], post["title"], post["body"]) for post in data)))
+        try:
+            await self.save_to_database(payload)
+        except BaseException:
+            # Без сохранения нельзя доверять 304 на следующем запросе
+            self._etag = self._last_modified = None
+            raise
+        return payload
+
+    def run(self):
+        """Цикл событий фонового потока; задачи передаются через run_coroutine_threadsafe"""
+        asyncio.set_event_loop(self.loop)
+        self.loop.run_forever()
+
+    def close(self):
+        """Остановка потока и освобождение сетевых ресурсов"""
+        if self.isRunning():
+            asyncio.run_coroutine_threadsafe(self.aclose(), self.loop).result()
+            asyncio.run_coroutine_threadsafe(
+                self.loop.shutdown_default_executor(), self.loop
+            ).result()
+            self.loop.call_soon_threadsafe(self.loop.stop)
+            self.wait()
+        self.loop.close()
+        self._conn.close()
 
 
 class MainWindow(QMainWindow):
+    loading_done = pyqtSignal(object)  # Сигнал с завершённой задачей (данные или ошибка)
+
     def __init__(self):
         super().__init__()
         self.setWindowTitle("Асинхронное обновление данных")
@@ -107,9 +252,9 @@ class MainWindow(QMainWindow):
         # Основные элементы интерфейса
         self.layout = QVBoxLayout()
         self.button = QPushButton("Загрузить данные")
-        self.table = QTableWidget()
-        self.table.setColumnCount(3)
-        self.table.setHorizontalHeaderLabels(["ID", "Title", "Body"])
+        self.model = PostsTableModel(self)
+        self.table = QTableView()
+        self.table.setModel(self.model)
         self.progress_bar = QProgressBar()
         self.status_bar = QStatusBar()
 
@@ -127,9 +272,11 @@ class MainWindow(QMainWindow):
 
         # Подготовка фонового потока и рабочего объекта
         self.worker = Worker()
-        self.worker.update_data.connect(self.display_data)
         self.worker.update_progress.connect(self.update_progress)
         self.worker.update_status.connect(self.update_status_bar)
+        self.loading_done.connect(self.on_loading_done)
+        self._refresh_inflight = False  # Флаг меняется только в GUI-потоке
+        self.worker.start()  # Запуск потока с постоянным циклом событий
 
         # Настройка логирования
         log_handler = StatusBarLogger(self.status_bar)
@@ -140,19 +287,47 @@ class MainWindow(QMainWindow):
         # Таймер для периодического обновления данных
         self.timer = QTimer(self)
         self.timer.timeout.connect(self.periodic_update_data)  # Таймер с вызовом обновления данных
-        self.timer.start(10000)  # Каждые 10 секунд
+        self.timer.start(POLL_INTERVAL_MS)
+
+    def submit_task(self):
+        """Передача загрузки в цикл событий фонового потока"""
+        self._refresh_inflight = True
+        future = asyncio.run_coroutine_threadsafe(
+            self.worker.fetch_and_save(), self.worker.loop
+        )
+        # Колбэк выполняется в фоновом потоке, поэтому в UI уходим через сигнал
+        future.add_done_callback(self.loading_done.emit)
 
     def start_loading(self):
         """Запуск загрузки данных"""
+        if self._refresh_inflight:
+            return
         self.progress_bar.setValue(0)
         self.button.setEnabled(False)
         logging.info("Запуск загрузки данных...")
-        self.worker.start()  # Запуск фонового потока
+        self.submit_task()
 
     def periodic_update_data(self):
         """Периодическое обновление данных с сервера"""
+        if self._refresh_inflight:
+            logging.info("Предыдущее обновление ещё выполняется, пропускаем проверку.")
+            return
         logging.info("Периодическая проверка обновлений...")
-        self.worker.start()  # Повторно запускаем фоновую задачу для получения и сохранения данных
+        self.submit_task()
+
+    def on_loading_done(self, future):
+        """Завершение фоновой задачи: отображение данных и снятие флага"""
+        self._refresh_inflight = False
+        self.button.setEnabled(True)
+        if future.cancelled():
+            return
+        error = future.exception()
+        if error is not None:
+            logging.error(f"Ошибка при загрузке данных: {error}")
+            return
+        payload = future.result()
+        if payload is not None:
+            self.display_data(payload)
 
     def update_progress(self, progress):
         """Обновление прогресса"""
@@ -162,19 +337,16 @@ class MainWindow(QMainWindow):
         """Обновление состояния статус-бара"""
         self.status_bar.showMessage(message, 3000)
 
-    def display_data(self, data):
-        """Отображение данных в таблице"""
-        self.table.setRowCount(len(data))  # Устанавливаем количество строк
-        for row_idx, post in enumerate(data):
-            self.table.setItem(row_idx, 0, QTableWidgetItem(str(post["id"])))
-            self.table.setItem(row_idx, 1, QTableWidgetItem(post["title"]))
-            self.table.setItem(row_idx, 2, QTableWidgetItem(post["body"]))
-        self.button.setEnabled(True)
+    def display_data(self, payload):
+        """Отображение данных в таблице; payload — столбцы (ids, titles, bodies)"""
+        # Один сброс модели вместо обновления каждой ячейки
+        self.model.set_rows([(str(pid), title, body) for pid, title, body in zip(*payload)])
         logging.info("Данные успешно загружены!")
 
 
 if __name__ == "__main__":
     app = QApplication(sys.argv)
     window = MainWindow()
+    app.aboutToQuit.connect(window.worker.close)
     window.show()
     sys.exit(app.exec())